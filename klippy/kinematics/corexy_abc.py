@@ -6,10 +6,12 @@
 # This file may be distributed under the terms of the GNU GPLv3 license.
 
 import logging
-from copy import deepcopy
 from collections import namedtuple
 import stepper
 
+# Axis letters, indexed by toolhead axis index.
+_AXIS_LETTERS = "XYZABCUVW"
+
 class CoreXYKinematicsABC:
     """CoreXY kinematics for the XYS or ABC axes in the main toolhead class.
 
@@ -38,7 +40,7 @@ class CoreXYKinematicsABC:
         self.axes_to_xyz = toolhead.axes_to_xyz
         
         # Configured set of axes (indexes) and their letter IDs. Can have length less or equal to 3.
-        self.axis_config = deepcopy(axes_ids)   # list of length <= 3: [0, 1, 3], [3, 4], [3, 4, 5], etc.
+        self.axis_config = list(axes_ids)       # list of length <= 3: [0, 1, 3], [3, 4], [3, 4, 5], etc.
         self.axis_names = axis_set_letters      # char of length <= 3: "XYZ", "AB", "ABC", etc.
         self.axis_count = len(self.axis_names)  # integer count of configured axes (e.g. 2 for "XY").
 
@@ -60,22 +62,26 @@ class CoreXYKinematicsABC:
         # NOTE: Full set of axes, forced to length 3. Starting at the first axis index (e.g. 0 for [0,1,2]),
         #       and ending at +3 (e.g. 3 for [0,1,2]).
         # NOTE: This attribute is used to select starting positions from a "move" object (see toolhead.py),
-        #       which requires this list to have length 3 (because trapq_append needs the three components).
-        # Example expected result: [0, 1, 2] for XYZ, [3, 4, 5] for ABC, [6, 7, 8] for UVW.
-        self.axis = list(range(3*triplet_number, 3*triplet_number + 3))  # Length 3
+        #       which requires this tuple to have length 3 (because trapq_append needs the three components).
+        # Example expected result: (0, 1, 2) for XYZ, (3, 4, 5) for ABC, (6, 7, 8) for UVW.
+        self.axis = tuple(range(3*triplet_number, 3*triplet_number + 3))  # Length 3
 
         # Save which axes from the "triplet" will not have steppers configured.
-        self.dummy_axes = list(set(self.axis).difference(self.axis_config))
+        self.dummy_axes = tuple(i for i in self.axis if i not in self.axis_config)
         # Get the axis names of these "Dummy axes".
-        self.dummy_axes_names = ["XYZABCUVW"[i] for i in self.dummy_axes]
+        self.dummy_axes_names = [_AXIS_LETTERS[i] for i in self.dummy_axes]
         
         # Total axis count from the toolhead.
         self.toolhead_axis_count = toolhead.axis_count  # len(self.axis_names)
         
+        # Scratch position lists reused by "home_axis" on every homing pass.
+        self._homepos_buf = [None] * (self.toolhead_axis_count + 1)
+        self._forcepos_buf = [None] * (self.toolhead_axis_count + 1)
+        
         # Report results of the multi-axis setup.
-        msg = f"CoreXYKinematicsABC: starting setup with axes '{self.axis_names}'"
-        msg += f", indexes '{self.axis_config}', and expanded indexes '{self.axis}'"
-        logging.info(msg)
+        logging.info("CoreXYKinematicsABC: starting setup with axes '%s'"
+                     ", indexes '%s', and expanded indexes '%s'",
+                     self.axis_names, self.axis_config, self.axis)
         
         if trapq is None:
             # Get the "trapq" object associated to the specified axes.
@@ -92,16 +98,23 @@ class CoreXYKinematicsABC:
         #       can have one or more stepper (PrinterStepper/MCU_stepper) objects.
         self.rails = [stepper.LookupMultiRail(config.getsection('stepper_' + n))
                       for n in self.axis_names.lower()]
+        # NOTE: Save the rail names, used as keys by "calc_position".
+        self._rail_names = tuple(r.get_name() for r in self.rails)
+        # NOTE: Rails do not change after this point, save their steppers.
+        self._all_steppers = tuple(s for rail in self.rails
+                                   for s in rail.get_steppers())
         
         # NOTE: Iterate over the steppers in each of the two XY rails, and
         #       register each stepper in the endstop of the other rail.
         #       This I expect because endstops are likely placed in a 
         #       regular "cartesian" way, but in CoreXY both steppers must 
         #       move when homing to either the X or Y endstops.
+        endstop_x = self.rails[0].get_endstops()[0][0]
+        endstop_y = self.rails[1].get_endstops()[0][0]
         for s in self.rails[1].get_steppers():
-            self.rails[0].get_endstops()[0][0].add_stepper(s)
+            endstop_x.add_stepper(s)
         for s in self.rails[0].get_steppers():
-            self.rails[1].get_endstops()[0][0].add_stepper(s)
+            endstop_y.add_stepper(s)
         # NOTE: This probably associates each stepper to a particular solver,
         #       thar corresponds to the appropriate kinematics.
         self.rails[0].setup_itersolve('corexy_stepper_alloc', b'+')
@@ -132,15 +145,31 @@ class CoreXYKinematicsABC:
         
         # Setup boundary checks
         self.reset_limits()
-        ranges = [r.get_range() for r in self.rails]
+        # Cached "get_status" result, and the limits it was built from.
+        self._status_sig = None
+        self._status_dict = None
+        mins, maxs = zip(*(r.get_range() for r in self.rails))
         # NOTE: Here I've swapped list expansion for dictionary expansion, and omitted "e",
         #       which will default to "None", and was previously forced to "0.0".
         #       See "cartesian_abc.py" for further detail.
-        ranges_dict = dict()
-        for a, r in zip(self.axis_names.lower(), ranges):
-            ranges_dict[a] = r
-        self.axes_min: namedtuple = toolhead.Coord(**{k: l for k, (l, h) in ranges_dict.items()})
-        self.axes_max: namedtuple = toolhead.Coord(**{k: h for k, (l, h) in ranges_dict.items()})
+        axis_names = self.axis_names.lower()
+        self.axes_min: namedtuple = toolhead.Coord(**dict(zip(axis_names, mins)))
+        self.axes_max: namedtuple = toolhead.Coord(**dict(zip(axis_names, maxs)))
+        
+        # Setup homing positions
+        # NOTE: The rail ranges and homing settings are fixed by the config,
+        #       so the (homepos, forcepos) pair of each rail is computed once
+        #       here, and looked up by "home_axis" on every homing pass.
+        self._home_params = []
+        for rail in self.rails:
+            position_min, position_max = rail.get_range()
+            hi = rail.get_homing_info()
+            forcepos = hi.position_endstop
+            if hi.positive_dir:
+                forcepos -= 1.5 * (hi.position_endstop - position_min)
+            else:
+                forcepos += 1.5 * (position_max - hi.position_endstop)
+            self._home_params.append((hi.position_endstop, forcepos))
     
     def reset_limits(self):
         # self.limits = [(1.0, -1.0)] * len(self.axis_config)
@@ -149,36 +178,36 @@ class CoreXYKinematicsABC:
         #       See "get_status" for more details.
         # NOTE: Using length 3
         self.limits = [(1.0, -1.0)] * 3
+        self._update_limit_bounds()
         # NOTE: I've got all of the (internal) calls covered.
         #       There may be other uses of the "limits" attribute elsewhere.
     
+    def _update_limit_bounds(self):
+        # NOTE: Flat tuples with the lower and upper limits, kept in sync with
+        #       "self.limits", so that the move checks can index them directly.
+        #       Call this after any change to "self.limits".
+        self._lim_lo = tuple(l for l, h in self.limits)
+        self._lim_hi = tuple(h for l, h in self.limits)
+    
     def get_steppers(self):
-        return [s for rail in self.rails for s in rail.get_steppers()]
+        return list(self._all_steppers)
     
     def calc_position(self, stepper_positions):
-        # Dummy default position.
-        pos = [0.0 for i in range(3)]
-        # Replace defaults.
-        for i, axis in enumerate(self.axis_config):
-            # e.g.: Get rail "stepper_a", with axis name "A", and axis index "3".
-            # We know that the "axis_config" and "rails" lists match in order
-            # because this is how they were defined during init in this class.
-            rail = self.rails[i]
-            stepper_position = stepper_positions[rail.get_name()]
-            # Axis may be from XYZ, ABC, or higher-indexed triplets.
-            # Get the remainder of the current axis to convert it to an
-            # index between 0 and 2, which can be used to overwrite the
-            # "dummy" position (i.e. 0.0 above).
-            pos[axis % 3] = stepper_position
+        # NOTE: Only the full "XYZ" configuration is supported (see "__init__"),
+        #       so the rails map directly to the X, Y and Z stepper positions.
+        rail_names = self._rail_names
+        a = stepper_positions[rail_names[0]]
+        b = stepper_positions[rail_names[1]]
+        c = stepper_positions[rail_names[2]]
         # Convert CoreXY stepper positions to cartesian XY coordinates.
-        xyz_pos = [0.5 * (pos[0] + pos[1]), 0.5 * (pos[0] - pos[1]), pos[2]]
-        return xyz_pos
+        return [0.5 * (a + b), 0.5 * (a - b), c]
     
     def set_position(self, newpos, homing_axes):
         for i, rail in enumerate(self.rails):
             rail.set_position(newpos)
             if i in homing_axes:
                 self.limits[i] = rail.get_range()
+        self._update_limit_bounds()
     
     def note_z_not_homed(self):
         # Helper for Safe Z Home
@@ -187,6 +216,7 @@ class CoreXYKinematicsABC:
         if "Z" in self.axis_names:
             # Helper for Safe Z Home
             self.limits[self.axis_map["Z"]] = (1.0, -1.0)
+            self._update_limit_bounds()
 
     def home(self, homing_state):
         # Each axis is homed independently and in order
@@ -196,15 +226,15 @@ class CoreXYKinematicsABC:
     
     def home_axis(self, homing_state, axis, rail):
         # Determine movement
-        position_min, position_max = rail.get_range()
-        hi = rail.get_homing_info()
-        homepos = [None for i in range(self.toolhead_axis_count + 1)]
-        homepos[axis] = hi.position_endstop
-        forcepos = list(homepos)
-        if hi.positive_dir:
-            forcepos[axis] -= 1.5 * (hi.position_endstop - position_min)
-        else:
-            forcepos[axis] += 1.5 * (position_max - hi.position_endstop)
+        home_value, force_value = self._home_params[self.axes_to_xyz(axis)]
+        # NOTE: "home_rails" only reads these lists (it copies them with
+        #       "_fill_coord"), so they can be reset in place and reused.
+        homepos = self._homepos_buf
+        forcepos = self._forcepos_buf
+        for i in range(len(homepos)):
+            homepos[i] = forcepos[i] = None
+        homepos[axis] = home_value
+        forcepos[axis] = force_value
         # Perform homing
         homing_state.home_rails([rail], forcepos, homepos)
     
@@ -213,49 +243,60 @@ class CoreXYKinematicsABC:
     
     def _check_endstops(self, move):
         end_pos = move.end_pos
+        axes_d = move.axes_d
+        lim_lo, lim_hi = self._lim_lo, self._lim_hi
         for i, axis in enumerate(self.axis_config):
-            if (move.axes_d[axis]
-                and (end_pos[axis] < self.limits[i][0]
-                     or end_pos[axis] > self.limits[i][1])):
-                if self.limits[i][0] > self.limits[i][1]:
+            pos = end_pos[axis]
+            if axes_d[axis] and (pos < lim_lo[i] or pos > lim_hi[i]):
+                err = move.move_error
+                if lim_lo[i] > lim_hi[i]:
                     # NOTE: self.limits will be "(1.0, -1.0)" when not homed, triggering this.
-                    msg = f"corexy_abc._check_endstops: Must home axis {self.axis_names[i]} first,"
-                    msg += f"limits={self.limits[i]} end_pos[axis]={end_pos[axis]} "
-                    msg += f"move.axes_d[axis]={move.axes_d[axis]}"
+                    name = self.axis_names[i]
+                    msg = f"corexy_abc._check_endstops: Must home axis {name} first,"
+                    msg += f"limits={self.limits[i]} end_pos[axis]={pos} "
+                    msg += f"move.axes_d[axis]={axes_d[axis]}"
                     logging.info(msg)
-                    raise move.move_error(f"Must home axis {self.axis_names[i]} first")
-                raise move.move_error()
+                    raise err(f"Must home axis {name} first")
+                raise err()
     
     def check_move(self, move):
-        limit_checks = []
-        for i, axis in enumerate(self.axis_config):
-            # TODO: Check if its better to iterate over "self.axis" instead,
-            #       see rationale in favor of "axis_config" above, at "_check_endstops".
-            pos = move.end_pos[axis]
-            limit_checks.append(pos < self.limits[i][0] or pos > self.limits[i][1])
-        if any(limit_checks):
-            self._check_endstops(move)
-        
         # TODO: Update this part of the code to handle 
         #       the case when Z axis is not configured.
-        if not move.axes_d[2]:
+        z_d = move.axes_d[2]
+        if not z_d:
             # Normal XY move - use defaults
+            # NOTE: Only the full "XYZ" configuration is supported, and Z is
+            #       not displaced here, so only X and Y can fail the check.
+            end_pos = move.end_pos
+            lim_lo, lim_hi = self._lim_lo, self._lim_hi
+            if (lim_lo[0] <= end_pos[0] <= lim_hi[0]
+                and lim_lo[1] <= end_pos[1] <= lim_hi[1]):
+                return
+            self._check_endstops(move)
             return
-        # Move with Z - update velocity and accel for slower Z axis
+        # Move with Z - update velocity and accel for slower Z axis.
+        # NOTE: "_check_endstops" already covers any out-of-bounds axis.
         self._check_endstops(move)
-        z_ratio = move.move_d / abs(move.axes_d[2])
+        z_ratio = move.move_d / (-z_d if z_d < 0. else z_d)
         move.limit_speed(
             self.max_z_velocity * z_ratio, self.max_z_accel * z_ratio)
     
     def get_status(self, eventtime):
         # NOTE: If you alter this you should probably
         #       do so also in the other "abc" kinematics.
-        axes = [a for a, (l, h) in zip(self.axis_names.lower(), self.limits) if l <= h]
-        return {
-            'homed_axes': "".join(axes),
+        # NOTE: The status only changes with the limits, so it is
+        #       rebuilt only when they differ from the cached ones.
+        sig = tuple(self.limits)
+        if sig == self._status_sig:
+            return self._status_dict
+        axes = "".join(a for a, (l, h) in zip(self.axis_names.lower(), sig) if l <= h)
+        self._status_sig = sig
+        self._status_dict = {
+            'homed_axes': axes,
             'axis_minimum': self.axes_min,
             'axis_maximum': self.axes_max,
         }
+        return self._status_dict
 
 def load_kinematics(toolhead, config, trapq=None, axes_ids=(0, 1, 2), axis_set_letters="XYZ"):
     return CoreXYKinematicsABC(toolhead, config, trapq, axes_ids, axis_set_letters)